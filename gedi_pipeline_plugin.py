@@ -194,6 +194,10 @@ class GEDIPipeline:
                 action)
             self.iface.removeToolBarIcon(action)
 
+        # The dialog outlives its runs; stop one still in progress before the plugin is unloaded
+        if getattr(self, "dlg", None) is not None:
+            self.dlg.shutdown()
+
 
     def run(self):
         """Run method that performs all the real work"""
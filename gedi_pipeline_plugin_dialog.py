@@ -1,9 +1,13 @@
 import os
 import sys
+import functools
+import hashlib
+import importlib.util
+import tempfile
 import threading
 import platform
+from collections import deque
 from pathlib import Path
-import sip
 
 from qgis.PyQt import uic
 from qgis.PyQt import QtCore, QtWidgets
@@ -21,49 +25,96 @@ FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), 'gedi_pipeline_plugin_dialog_base.ui'))
 
 
-class StreamToSignal:
-    """Redirect text writes to a Qt signal."""
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
 
-    def __init__(self, signal):
-        self.signal = signal
+
+# Python packages the pipeline needs in the QGIS environment
+REQS = ("pandas", "geopandas", "numpy", "shapely", "earthaccess", "requests", "h5py")
+
+
+@functools.lru_cache(maxsize=1)
+def _probe_dependencies():
+    """Check the Python deps once per session. Returns (missing_modules, hdf5_mismatch)."""
+    # find_spec locates the packages without importing them
+    missing = tuple(sorted(m for m in REQS if importlib.util.find_spec(m) is None))
+    hdf5_mismatch = None
+    # h5py special handling: only importing it reveals the HDF5 library it runs with
+    if "h5py" not in missing:
+        try:
+            import h5py
+
+            built = getattr(h5py.version, "hdf5_built_version", None)
+            runtime = getattr(h5py.version, "hdf5_version", None)
+            if built is None and hasattr(h5py.version, "hdf5_built_version_tuple"):
+                built = ".".join(map(str, h5py.version.hdf5_built_version_tuple))
+            if runtime is None and hasattr(h5py.version, "hdf5_version_tuple"):
+                runtime = ".".join(map(str, h5py.version.hdf5_version_tuple))
+            if built and runtime and built.split(".")[:2] != runtime.split(".")[:2]:
+                hdf5_mismatch = (built, runtime)
+        except ImportError:
+            missing = tuple(sorted(missing + ("h5py",)))
+    return missing, hdf5_mismatch
+
+
+class LogBuffer:
+    """
+    Collect text writes from the worker thread. The dialog drains them in batches on a timer
+    instead of receiving one queued signal per line.
+    """
+
+    def __init__(self):
+        self._lines = deque()
 
     def write(self, text):
         text = text.strip()
         if text:
-            self.signal.emit(text)
+            self._lines.append(text)
 
     def flush(self):
         pass
 
+    def drain(self):
+        """Remove and return all buffered lines. Safe to call while the worker keeps writing."""
+        lines = []
+        while self._lines:
+            lines.append(self._lines.popleft())
+        return lines
 
-class PipelineWorker(QtCore.QObject):
-    log = QtCore.pyqtSignal(str)
+
+class PipelineSignals(QtCore.QObject):
+    """Signals of PipelineWorker; QRunnable is not a QObject and cannot declare them itself."""
     finished = QtCore.pyqtSignal(bool, list, str)
 
-    def __init__(self, params, plugin_dir, cancel_event):
+
+class PipelineWorker(QtCore.QRunnable):
+    def __init__(self, params, plugin_dir, cancel_event, log_buffer, roi_cache, session_cache):
         super().__init__()
+        self.signals = PipelineSignals()
         self.params = params
         self.plugin_dir = plugin_dir
         self.cancel_event = cancel_event
+        self.log = log_buffer
+        self.roi_cache = roi_cache
+        self.session_cache = session_cache
 
-    @QtCore.pyqtSlot()
     def run(self):
         stdout_orig, stderr_orig = sys.stdout, sys.stderr
-        sys.stdout = StreamToSignal(self.log)
-        sys.stderr = StreamToSignal(self.log)
+        sys.stdout = self.log
+        sys.stderr = self.log
         try:
             roi = self._compute_roi()
             self._prepare_netrc()
             pipeline = self._build_pipeline(roi)
-            self.log.emit("[Pipeline] Starting pipeline...")
+            self.log.write("[Pipeline] Starting pipeline...")
             granules = pipeline.run_pipeline()
-            outputs = self._collect_outputs(granules)
-            self.finished.emit(True, outputs, "")
+            result = (True, self._collect_outputs(granules), "")
         except Exception as e:
-            self.finished.emit(False, [], str(e))
+            result = (False, [], str(e))
         finally:
             sys.stdout = stdout_orig
             sys.stderr = stderr_orig
+        self.signals.finished.emit(*result)
 
     def _build_pipeline(self, roi):
         candidates = [
@@ -100,8 +151,30 @@ class PipelineWorker(QtCore.QObject):
             keep_original_file=self.params["keep_original"],
             cancel_event=self.cancel_event,
             roi_path=self.params.get("polygon_source") or None,
+            download_workers=self.params.get("dl_workers", 6),
+            session_pool=self._session_pool(),
         )
 
+    def _session_pool(self):
+        """EarthData sessions kept by the dialog across runs, rebuilt when the credentials change."""
+        from .pipeline.pipeline.downloader import SessionPool
+
+        user = self.params["earthdata_user"]
+        pwd = self.params["earthdata_pass"]
+        if user and pwd:
+            credentials = f"{user}\n{pwd}".encode()
+        else:
+            home = Path.home()
+            credentials = b"".join(p.read_bytes() for p in (home / ".netrc", home / "_netrc") if p.exists())
+        key = _digest(credentials)
+
+        if self.session_cache.get("key") != key:
+            if "pool" in self.session_cache:
+                self.session_cache["pool"].close()
+            self.session_cache["pool"] = SessionPool(user or None, pwd or None)
+            self.session_cache["key"] = key
+        return self.session_cache["pool"]
+
     def _prepare_netrc(self):
         user = self.params["earthdata_user"]
         pwd = self.params["earthdata_pass"]
@@ -113,16 +186,33 @@ class PipelineWorker(QtCore.QObject):
         netrc_files = [Path.home() / ".netrc"]
         if os.name == "nt":
             netrc_files.append(Path.home() / "_netrc")
+        data = content.encode()
+        digest = _digest(data)
         for netrc_path in netrc_files:
             try:
-                netrc_path.write_text(content)
+                # Leave the file untouched when it already holds these credentials
                 try:
-                    netrc_path.chmod(0o600)
-                except Exception:
+                    if _digest(netrc_path.read_bytes()) == digest:
+                        continue
+                except FileNotFoundError:
                     pass
-                self.log.emit(f"[Auth] Wrote credentials to {netrc_path} for EarthData.")
+
+                # Temporary files are created with 0600 permissions; replacing the target is atomic.
+                # Replace the file a symlinked .netrc points to, keeping the link in place
+                target = netrc_path.resolve()
+                tmp_path = None
+                try:
+                    with tempfile.NamedTemporaryFile("wb", dir=target.parent, prefix=".netrc-", delete=False) as tmp:
+                        tmp_path = tmp.name
+                        tmp.write(data)
+                    os.replace(tmp_path, target)
+                except Exception:
+                    if tmp_path is not None and os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                self.log.write(f"[Auth] Wrote credentials to {netrc_path} for EarthData.")
             except Exception as e:
-                self.log.emit(f"[Auth] Failed to write credentials to {netrc_path}: {e}")
+                self.log.write(f"[Auth] Failed to write credentials to {netrc_path}: {e}")
 
     def _compute_roi(self):
         layer_id = self.params["polygon_layer_id"]
@@ -140,6 +230,15 @@ class PipelineWorker(QtCore.QObject):
         if not extent.isFinite():
             raise RuntimeError("Layer extent is not valid.")
 
+        # Reuse the EPSG:4326 bbox of a previous run over the same extent
+        extent_hash = tuple(
+            round(v, 7) for v in (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+        )
+        key = (layer_id, bool(self.params["selected_features_only"]), extent_hash)
+        roi = self.roi_cache.get(key)
+        if roi is not None:
+            return list(roi)
+
         crs_src = layer.crs()
         crs_dest = QgsCoordinateReferenceSystem("EPSG:4326")
         if crs_src != crs_dest:
@@ -147,12 +246,13 @@ class PipelineWorker(QtCore.QObject):
             extent = transform.transformBoundingBox(extent)
 
         # ROI format: [UL_LAT, UL_LON, LR_LAT, LR_LON]
-        return [extent.yMaximum(), extent.xMinimum(), extent.yMinimum(), extent.xMaximum()]
+        roi = [extent.yMaximum(), extent.xMinimum(), extent.yMinimum(), extent.xMaximum()]
+        self.roi_cache[key] = tuple(roi)
+        return roi
 
     def _collect_outputs(self, granules):
-        outputs = []
-        out_dir = Path(self.params["output_dir"])
-        return [str(p) for p in out_dir.glob("*.gpkg")]
+        with os.scandir(self.params["output_dir"]) as entries:
+            return [e.path for e in entries if e.name.endswith(".gpkg") and e.is_file()]
 
 
 class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
@@ -161,9 +261,37 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
         super(GEDIPipelineDialog, self).__init__(parent)
         self.setupUi(self)
         self.plugin_dir = plugin_dir or os.path.dirname(__file__)
-        self._worker_thread = None
         self._cancel_event = threading.Event()
 
+        # Runs execute on a dedicated pool, one at a time; QGIS' global pool is left alone
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._worker = None
+        self._running = False
+
+        # Worker output is buffered and appended to the log panel in batches
+        self._log_buffer = LogBuffer()
+        self._log_timer = QtCore.QTimer(self)
+        self._log_timer.setInterval(50)
+        self._log_timer.timeout.connect(self._flush_log)
+        self.log_text_edit.document().setMaximumBlockCount(5000)
+
+        # EPSG:4326 ROI of previous runs by (layer id, selected only, extent), dropped when the layer changes
+        self._roi_cache = {}
+        self._roi_watched_layers = set()
+
+        # Authenticated EarthData sessions reused across runs, with the digest of the credentials they were built for
+        self._session_cache = {}
+
+        # Ids of the polygon layers in the project, kept in sync with the project signals (dict used as ordered set)
+        self._polygon_layer_ids = {}
+        project = QgsProject.instance()
+        project.layersAdded.connect(self._on_layers_added)
+        project.layersRemoved.connect(self._on_layers_removed)
+        project.layerWillBeRemoved.connect(self._on_layer_will_be_removed)
+        project.crsChanged.connect(self._rebuild_polygon_layer_cache)
+        self._rebuild_polygon_layer_cache()
+
         self._init_polygon_menu()
         self.populate_polygon_layers()
 
@@ -177,10 +305,13 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
         from_file = menu.addAction("From computer")
         browse_layer = menu.addAction("Browse layer")
         refresh_layers = menu.addAction("Refresh layers")
+        menu.addSeparator()
+        recheck_environment = menu.addAction("Recheck environment")
 
         from_file.triggered.connect(self.on_polygon_from_file)
         browse_layer.triggered.connect(self.on_polygon_browse_layer)
         refresh_layers.triggered.connect(self.populate_polygon_layers)
+        recheck_environment.triggered.connect(self.on_recheck_environment)
 
         self.polygon_options_btn.setMenu(menu)
 
@@ -193,18 +324,44 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
         if directory:
             self.output_dir_lineedit.setText(directory)
 
+    @staticmethod
+    def _is_polygon_layer(layer):
+        return (
+            layer.type() == QgsMapLayer.VectorLayer
+            and QgsWkbTypes.geometryType(layer.wkbType()) == QgsWkbTypes.PolygonGeometry
+        )
+
+    def _rebuild_polygon_layer_cache(self):
+        """Scan the whole project for polygon layers."""
+        self._polygon_layer_ids = {
+            layer.id(): None
+            for layer in QgsProject.instance().mapLayers().values()
+            if self._is_polygon_layer(layer)
+        }
+
+    def _on_layers_added(self, layers):
+        for layer in layers:
+            if self._is_polygon_layer(layer):
+                self._polygon_layer_ids[layer.id()] = None
+
+    def _on_layers_removed(self, layer_ids):
+        for layer_id in layer_ids:
+            self._polygon_layer_ids.pop(layer_id, None)
+            self._roi_watched_layers.discard(layer_id)
+            self._invalidate_roi(layer_id)
+
+    def _on_layer_will_be_removed(self, layer_id):
+        self._polygon_layer_ids.pop(layer_id, None)
+
     def populate_polygon_layers(self):
         """Fill combo with polygon layers currently loaded in QGIS."""
         current_id = self.polygon_layer_combo.currentData()
         self.polygon_layer_combo.blockSignals(True)
         self.polygon_layer_combo.clear()
 
-        polygon_layers = []
-        for layer in QgsProject.instance().mapLayers().values():
-            if layer.type() != QgsMapLayer.VectorLayer:
-                continue
-            if QgsWkbTypes.geometryType(layer.wkbType()) == QgsWkbTypes.PolygonGeometry:
-                polygon_layers.append(layer)
+        project = QgsProject.instance()
+        polygon_layers = [project.mapLayer(layer_id) for layer_id in self._polygon_layer_ids]
+        polygon_layers = [layer for layer in polygon_layers if layer is not None]
 
         if not polygon_layers:
             self.polygon_layer_combo.addItem("No polygon layers found", None)
@@ -221,10 +378,25 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
         self.polygon_layer_combo.blockSignals(False)
         self.on_polygon_layer_changed()
 
+    def _watch_roi_layer(self, layer):
+        """Drop the cached ROI of *layer* whenever its extent or CRS changes."""
+        layer_id = layer.id()
+        if layer_id in self._roi_watched_layers:
+            return
+        layer.extentChanged.connect(functools.partial(self._invalidate_roi, layer_id))
+        layer.crsChanged.connect(functools.partial(self._invalidate_roi, layer_id))
+        self._roi_watched_layers.add(layer_id)
+
+    def _invalidate_roi(self, layer_id):
+        for key in list(self._roi_cache):
+            if key[0] == layer_id:
+                self._roi_cache.pop(key, None)
+
     def on_polygon_layer_changed(self):
         layer_id = self.polygon_layer_combo.currentData()
         layer = QgsProject.instance().mapLayer(layer_id) if layer_id else None
         if layer:
+            self._watch_roi_layer(layer)
             self.polygon_path_lineedit.setText(layer.source())
         else:
             self.polygon_path_lineedit.clear()
@@ -274,7 +446,7 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
             return
         if not self.check_dependencies():
             return
-        if self._worker_thread and self._worker_thread.isRunning():
+        if self._running:
             QtWidgets.QMessageBox.information(self, "Pipeline running", "Please wait for the current run to finish.")
             return
 
@@ -301,6 +473,7 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
             "earthdata_user": self.earthdata_user_edit.text().strip(),
             "earthdata_pass": self.earthdata_pass_edit.text(),
             "keep_login": self.keep_login_check.isChecked(),
+            # Parsed by the subsetter, as for the CLI
             "beams": self.beams_lineedit.text().strip(),
             "sds": self.sds_lineedit.text().strip(),
             "keep_original": self.keep_original_check.isChecked(),
@@ -318,34 +491,14 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
     
     def check_dependencies(self):
         """Ensure required Python deps are available in the QGIS environment."""
-        missing = []
-        hdf5_mismatch = None
-        # h5py special handling
-        try:
-            import h5py
-
-            built = getattr(h5py.version, "hdf5_built_version", None)
-            runtime = getattr(h5py.version, "hdf5_version", None)
-            if built is None and hasattr(h5py.version, "hdf5_built_version_tuple"):
-                built = ".".join(map(str, h5py.version.hdf5_built_version_tuple))
-            if runtime is None and hasattr(h5py.version, "hdf5_version_tuple"):
-                runtime = ".".join(map(str, h5py.version.hdf5_version_tuple))
-            if built and runtime and built.split(".")[:2] != runtime.split(".")[:2]:
-                hdf5_mismatch = (built, runtime)
-        except ImportError:
-            missing.append("h5py")
-        for mod in ["pandas", "geopandas", "numpy", "shapely", "earthaccess", "requests"]:
-            try:
-                __import__(mod)
-            except ImportError:
-                missing.append(mod)
+        missing, hdf5_mismatch = _probe_dependencies()
 
         if not missing and not hdf5_mismatch:
             return True
 
         msg_lines = []
         if missing:
-            msg_lines.append("Missing Python packages:\n  " + ", ".join(sorted(set(missing))))
+            msg_lines.append("Missing Python packages:\n  " + ", ".join(missing))
 
         py_path = sys.executable
         os_name = platform.system()
@@ -357,12 +510,12 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
             msg_lines.append(
                 "Windows/OSGeo4W: run the OSGeo4W installer in Advanced mode and add package 'python3-h5py' "
                 "and other missing ones, or in OSGeo4W Shell run:\n"
-                f'  python -m pip install --user ' + " ".join(sorted(set(missing))) if missing else ""
+                f'  python -m pip install --user ' + " ".join(missing) if missing else ""
             )
         elif os_name == "Darwin":
             msg_lines.append(
                 "macOS: use QGIS Python to install:\n"
-                f'  python -m pip install --user ' + " ".join(sorted(set(missing))) if missing else ""
+                f'  python -m pip install --user ' + " ".join(missing) if missing else ""
             )
         else:
             msg_lines.append(
@@ -373,24 +526,35 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
         QtWidgets.QMessageBox.critical(self, "Missing dependencies", "\n\n".join([m for m in msg_lines if m]))
         return False
 
+    def on_recheck_environment(self):
+        """Drop the cached dependency probe, e.g. after installing packages while QGIS is open."""
+        _probe_dependencies.cache_clear()
+        if self.check_dependencies():
+            self.log_text_edit.append("[Environment] All required Python packages are available.")
+
     def _start_worker(self, params):
-        self._worker_thread = QtCore.QThread(self)
-        self._worker = PipelineWorker(params, self.plugin_dir, self._cancel_event)
-        self._worker.moveToThread(self._worker_thread)
-        self._worker_thread.started.connect(self._worker.run)
-        self._worker.log.connect(self.append_log)
-        self._worker.finished.connect(self.on_worker_finished)
-        self._worker.finished.connect(self._worker_thread.quit)
-        self._worker.finished.connect(self._worker.deleteLater)
-        self._worker_thread.finished.connect(self._worker_thread.deleteLater)
-        self._worker_thread.start()
-
-    @QtCore.pyqtSlot(str)
-    def append_log(self, message):
-        self.log_text_edit.append(message)
+        # Keep the runnable referenced from Python so its signals outlive run()
+        self._worker = PipelineWorker(
+            params, self.plugin_dir, self._cancel_event, self._log_buffer, self._roi_cache, self._session_cache
+        )
+        self._worker.setAutoDelete(False)
+        self._worker.signals.finished.connect(self.on_worker_finished)
+        self._running = True
+        self._log_timer.start()
+        self._pool.start(self._worker)
+
+    def _flush_log(self):
+        self.append_log(self._log_buffer.drain())
+
+    @QtCore.pyqtSlot(list)
+    def append_log(self, messages):
+        if messages:
+            self.log_text_edit.append("\n".join(messages))
 
     @QtCore.pyqtSlot(bool, list, str)
     def on_worker_finished(self, success, outputs, error_message):
+        self._log_timer.stop()
+        self._flush_log()
         self.progress_bar.setRange(0, 1)
         self.progress_bar.setValue(1 if success else 0)
         if success:
@@ -399,7 +563,7 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
         else:
             self.log_text_edit.append(f"[Error] {error_message}")
 
-        self._worker_thread = None
+        self._running = False
         self.close_button.setText("Close")
 
     def _load_outputs(self, outputs):
@@ -419,17 +583,15 @@ class GEDIPipelineDialog(QtWidgets.QDialog, FORM_CLASS):
             self.log_text_edit.append(f"[Loader] Loaded {added} layer(s) into QGIS.")
 
     def on_cancel_close(self):
-        try:
-            if (
-                self._worker_thread
-                and not sip.isdeleted(self._worker_thread)
-                and self._worker_thread.isRunning()
-            ):
-                self._cancel_event.set()
-                self.log_text_edit.append("[Pipeline] Cancellation requested. Waiting for current task to stop...")
-                self.close_button.setText("Stop")
-                return
-        except RuntimeError:
-            # thread wrapper already deleted; fall through to close
-            pass
+        if self._running:
+            self._cancel_event.set()
+            self.log_text_edit.append("[Pipeline] Cancellation requested. Waiting for current task to stop...")
+            self.close_button.setText("Stop")
+            return
         self.reject()
+
+    def shutdown(self):
+        """Cancels a running pipeline and waits for it to stop, before the dialog and its thread pool go away."""
+        if self._running:
+            self._cancel_event.set()
+        self._pool.waitForDone()
@@ -1,7 +1,25 @@
 import os
 import requests
+import urllib3
 import getpass
 import netrc
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of a single network read and disk write for granule files, in bytes
+DEFAULT_CHUNK_SIZE = 1 << 20
+# Granules larger than LARGE_GRANULE_SIZE are copied in blocks of at least LARGE_CHUNK_SIZE
+LARGE_GRANULE_SIZE = 64 << 20
+LARGE_CHUNK_SIZE = 4 << 20
+# Suffix of a granule file while it is being downloaded
+PART_SUFFIX = ".part"
+# Responses that mean the credentials are wrong; retrying them only wastes requests
+AUTH_ERROR_CODES = (401, 403)
 
 class SessionNASA(requests.Session):
     """
@@ -53,6 +71,62 @@ class SessionNASA(requests.Session):
                 del headers["Authorization"]
         return
 
+class SessionPool:
+    """
+    Authenticated SessionNASA objects sharing one set of credentials.
+
+    Every download checks out a session of its own, as requests.Session is not safe to share across threads.
+    Idle sessions keep their pooled connections, so a pool kept across pipeline runs skips new TLS handshakes.
+    """
+
+    def __init__(self, username=None, password=None):
+        self.username, self.password = username, password
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        # The first session resolves the credentials (.netrc/_netrc or prompt), later ones reuse them
+        with self._lock:
+            session = SessionNASA(self.username, self.password)
+            self.username, self.password = session.username, session.password
+        return session
+
+    def login(self):
+        """Resolve the credentials up front, keeping the session for the next checkout."""
+        if self._idle.empty():
+            self._idle.put(self._new_session())
+
+    @contextmanager
+    def session(self):
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = self._new_session()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+@dataclass
+class DownloadResult:
+	"""
+	Outcome of a granule download. *retryable* tells whether trying again may succeed (e.g. a dropped connection)
+	as opposed to a permanent failure (e.g. bad credentials). Evaluates to *ok* in a boolean context.
+	"""
+	ok: bool
+	retryable: bool = False
+	bytes_written: int = 0
+
+	def __bool__(self):
+		return self.ok
+
 class GEDIDownloader:
 	"""
 	The GEDIDownloader :class: implements a downloading mechanism for a given NASA Repository link, while keeping
@@ -64,103 +138,229 @@ class GEDIDownloader:
 		persist_login: Choice to persist login and save to a .netrc file. See Earthdata Access API for more info:
 					   https://earthaccess.readthedocs.io/en/latest/howto/authenticate/
 		save_path: Absolute path to save the downloaded files. If None, saves to current working directory (script).
+		session_pool: SessionPool to download with, e.g. one kept alive across runs. If None, creates a new one.
+		cancel_event: threading.Event that, once set, stops running downloads after their current chunk.
+
+	Downloads may run concurrently from several threads; each download checks out its own session from the pool.
 	"""
 
-	def __init__(self, persist_login=False, save_path=None):
+	def __init__(self, persist_login=False, save_path=None, session_pool=None, cancel_event=None):
 		self.save_path = save_path if save_path is not None else ""
+		self.cancel_event = cancel_event
 		print("Logging in EarthData...")
 		# earthaccess is unavailable for QGIS; rely on requests + netrc.
-		self.session = SessionNASA()
+		self.sessions = session_pool if session_pool is not None else SessionPool()
+		self.sessions.login()
+		# Remote granule sizes by URL, so retries do not probe the server again
+		self._content_lengths = {}
+
+	def _cancelled(self):
+		return self.cancel_event is not None and self.cancel_event.is_set()
 	
-	def __download(self, content, save_path):
-		"""Download"""
-		written = 0
-		with open(save_path, "wb") as file:
-			for chunk in content:
-				# Filter out keep alive chunks
+	def __download(self, raw, save_path, size=None, chunk_size=DEFAULT_CHUNK_SIZE):
+		"""
+		Copies the raw response stream to *save_path* in *chunk_size* blocks. When the final *size* is known, the file
+		is preallocated and the page cache is hinted for sequential access. Stops early once the download is cancelled.
+		Returns the number of bytes written.
+		"""
+		with open(save_path, "wb", buffering=0) as file:
+			if size:
+				file.truncate(size)
+				if hasattr(os, "posix_fadvise"):
+					os.posix_fadvise(file.fileno(), 0, size, os.POSIX_FADV_SEQUENTIAL)
+
+			# Same loop as shutil.copyfileobj, checking for cancellation between chunks
+			while not self._cancelled():
+				chunk = raw.read(chunk_size)
 				if not chunk:
-					continue
-				file.write(chunk)
-				written += len(chunk)
+					break
+				# Unbuffered writes may be partial
+				view = memoryview(chunk)
+				while view:
+					view = view[file.write(view):]
+			return file.tell()
 
-	def __precheck_file(self, file_path, size):
+	def __precheck_file(self, file_path, size=None, url=None, session=None):
 		"""
 		Prechecking file mechanism function - if not exists or is corrupted (not equal to the download size), it downloads the file.
+		Without *size*, the remote size of *url* is probed with *session*, and only when the file exists.
+
+		Returns:
+			True if the file is complete, False if it must be downloaded, None if it exists but the remote size is unknown.
 		"""
-		# File does not exist in save_path
-		if not os.path.exists(file_path):
+		try:
+			size_on_disk = os.stat(file_path).st_size
+		except FileNotFoundError:
+			# File does not exist in save_path
 			print(f"[Downloader] Downloading granule and saving \"{file_path}\"...")
 			return False
 
-		# File exists but not complete, restart download
-		if os.path.getsize(file_path) != size:
+		if size is None:
+			size = self._probe(session, url)
+			if size is None:
+				return None
+
+		# File exists but not complete, restart download. The new download replaces it once complete
+		if size_on_disk != size:
 			print(f"[Downloader] File at \"{file_path}\" exists but corrupted. Downloading again...")
-			# Delete file and restart download
-			os.remove(file_path)
 			return False
 
 		# File exists and complete, skip download
 		print(f"[Downloader] File at \"{file_path}\" exists. Skipping download...")
 		return True
 
-
-	def download_granule(self, url, chunk_size=128):
+	def download_granule(self, url, chunk_size=1024, exists=None):
 		"""
 		This function downloads the file from a given URL. Must keep a Login Session alive.
 		Args:
 			url: NASA Repo URL to download the file.
-			chunk_size: Specify chunk size for download in kilobytes. Defaults to 128 KB.
+			chunk_size: Specify chunk size for download in kilobytes. Defaults to 1 MB, raised to 4 MB for granules over 64 MB.
+			exists: Whether the file is already in save_path, when the caller knows (e.g. from a directory listing).
+					False skips the local file check.
+
+		Returns:
+			a DownloadResult stating whether the file is complete on disk and, if not, whether a retry may help.
 		"""
 		filename = url.split("/")[-1]
 
 		# If even the filename does not have "GEDI" in it, do not download
 		if not "GEDI" in filename:
 			print(f"[Downloader] Invalid URL {url}. Please check URL and download again.")
-			return False
+			return DownloadResult(ok=False)
 
 		file_path = os.path.join(self.save_path, filename)
 		chunk_size = chunk_size * 1024 # KB chunk
 
-		http_response = self.session.get(url, stream=True)
+		# The session is only used within this block, it goes back to the pool for other threads afterwards
+		with self.sessions.session() as session:
 
-		# If http response other than OK 200, user needs to check credentials
-		if not http_response.ok:
-			print(f"[Downloader] Invalid credentials for Login session. You may want to delete the credentials on the '.netrc' file and start over.")
-			return False
+			# A local copy only needs the remote size to be checked, which a HEAD request gives without opening a download
+			if exists is False:
+				print(f"[Downloader] Downloading granule and saving \"{file_path}\"...")
+				return self._fetch(session, url, file_path, chunk_size)
 
-		response_length = http_response.headers.get('content-length')
+			complete = self.__precheck_file(file_path, url=url, session=session)
+			if complete:
+				return DownloadResult(ok=True)
+
+			return self._fetch(session, url, file_path, chunk_size, check_existing=complete is None)
+
+	def _probe(self, session, url):
+		"""
+		Returns the size in bytes of the remote granule from a HEAD request made with *session*, or None if the server
+		does not report it.
+		"""
+		if url in self._content_lengths:
+			return self._content_lengths[url]
+
+		try:
+			http_response = session.head(url, allow_redirects=True)
+		except requests.RequestException:
+			return None
+
+		response_length = http_response.headers.get('content-length') if http_response.ok else None
 		if response_length is None:
-			print("[Downloader] Missing content-length header; skipping download.")
-			return False
+			return None
+
+		self._content_lengths[url] = int(response_length)
+		return self._content_lengths[url]
+
+	def _fetch(self, session, url, file_path, chunk_size, check_existing=False):
+		"""
+		Downloads the granule at *url* to *file_path*.
+		Args:
+			session: EarthData session checked out from the pool by the calling thread.
+			chunk_size: Chunk size for download in bytes.
+			check_existing: Compare an existing file against the content-length of the GET response first,
+							for servers that do not report the size on HEAD requests.
+		"""
+		try:
+			http_response = session.get(url, stream=True)
+		except requests.RequestException as e:
+			print(f"[Downloader] Connection error for {url}: {e}")
+			return DownloadResult(ok=False, retryable=True)
+
+		with http_response:
+			# Credentials are refused, every retry would fail the same way
+			if http_response.status_code in AUTH_ERROR_CODES:
+				print(f"[Downloader] Invalid credentials for Login session. You may want to delete the credentials on the '.netrc' file and start over.")
+				return DownloadResult(ok=False)
 
-		# If file not exists, download
-		if not self.__precheck_file(file_path, int(response_length)):
-			self.__download(http_response.iter_content(chunk_size=chunk_size), file_path)
+			# Only server-side errors and throttling are worth retrying
+			if not http_response.ok:
+				print(f"[Downloader] Request for {url} failed with HTTP {http_response.status_code}.")
+				return DownloadResult(ok=False, retryable=http_response.status_code >= 500 or http_response.status_code == 429)
+
+			response_length = http_response.headers.get('content-length')
+			if response_length is None:
+				print("[Downloader] Missing content-length header; skipping download.")
+				return DownloadResult(ok=False)
+			self._content_lengths[url] = int(response_length)
+
+			if check_existing and self.__precheck_file(file_path, int(response_length)):
+				return DownloadResult(ok=True)
+
+			if int(response_length) > LARGE_GRANULE_SIZE:
+				chunk_size = max(chunk_size, LARGE_CHUNK_SIZE)
+
+			# Copy the body as sent, content-length refers to the undecoded bytes
+			http_response.raw.decode_content = False
+			# Write next to the granule and only give the file its name once complete. The partial file is preallocated
+			# to its final size, so a download killed midway must never be found under the granule name
+			part_path = file_path + PART_SUFFIX
+			try:
+				written = self.__download(http_response.raw, part_path, int(response_length), chunk_size)
+			except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+				print(f"[Downloader] Connection lost while downloading {url}: {e}")
+				os.remove(part_path)
+				return DownloadResult(ok=False, retryable=True)
+
+		if self._cancelled():
+			print(f"[Downloader] Download of {url} cancelled.")
+			os.remove(part_path)
+			return DownloadResult(ok=False, bytes_written=written)
 
 		# Check file integrity / if it downloaded correctly
-		if not os.path.getsize(file_path) == int(response_length):
+		if not written == int(response_length):
 			# If not downloaded correctly, send message for download retry
-			return False
+			os.remove(part_path)
+			return DownloadResult(ok=False, retryable=True, bytes_written=written)
 
-		return True
+		os.replace(part_path, file_path)
+		return DownloadResult(ok=True, bytes_written=written)
+
+	def _download_with_retry(self, url, attempts=3, base=1.5, exists=None):
+		"""
+		Downloads a granule, retrying transient failures with exponential backoff and jitter.
+		Permanent failures (e.g. refused credentials) are not retried.
+		Args:
+			url: NASA Repo URL to download the file.
+			attempts: Maximum number of download attempts.
+			base: Base of the exponential backoff, in seconds.
+			exists: See download_granule. Only used for the first attempt, a failed one may leave a partial file.
+		"""
+		result = self.download_granule(url, exists=exists)
+		for i in range(attempts - 1):
+			if result.ok or not result.retryable or self._cancelled():
+				break
+			delay = base ** i + random.random() * 0.2
+			print(f"[Downloader] Fail download for link {url}. Retry {i + 1} in {delay:.1f} s...")
+			time.sleep(delay)
+			result = self.download_granule(url)
+
+		if not result.ok:
+			print(f"[Downloader] Fail download for link {url}. Skipping...")
+		return result
 
-	def download_files(self, files_url):
+	def download_files(self, files_url, max_workers=6):
 		"""
 		This function downloads a list of files with given URLs. Must keep a Login Session alive.
 		Args:
 			files_url: A list containing GEDI files URLs from EarthData Repository
+			max_workers: Number of granules downloaded concurrently.
 		"""
 
 		# Start download for every granule
-		for g in files_url:
-			if not self.download_granule(g[0]):
-				retries = 3
-				print(f"[Downloader] Fail download for link {g}. Retrying...")
-				while retries > 0:
-					print(f"Retry {retries}")
-					if self.download_granule(g[0]):
-						break
-					retries -= 1
-				if retries == 0:
-					print(f"[Downloader] Fail download for link {g}. Skipping...")
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			list(executor.map(lambda g: self._download_with_retry(g[0]), files_url))
 		return files_url
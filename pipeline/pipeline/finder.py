@@ -1,6 +1,13 @@
 import os
+import json
+import tempfile
 import requests as r
-from datetime import datetime
+from datetime import datetime, timedelta
+
+# Search results of the last run, saved in the output folder
+CACHE_FILENAME = ".finder_cache.json"
+# Age after which saved results are searched again, so newly ingested or reprocessed granules are picked up
+CACHE_TTL = timedelta(hours=24)
 
 # Set up dictionary where key is GEDI shortname + version
 concept_ids = {
@@ -120,17 +127,93 @@ class GEDIFinder:
         return sum(float(l[1]) for l in link_list) / 1000
 
 
-    def find(self, save_file=True, output_filepath=None) -> list:
+    def __cache_key(self):
+        """
+        Search parameters the cached results were found with. Any change invalidates the cache.
+        """
+        return {
+            "product": self.product,
+            "version": self.version,
+            "date_start": self.date_start.isoformat(),
+            "date_end": self.date_end.isoformat(),
+            "recurring_months": self.recurring_months,
+            "roi": self.roi,
+        }
+
+
+    def __load_cache(self, cache_path):
+        """
+        Returns the granules of a previous search with the same parameters made less than CACHE_TTL ago, or None.
+        """
+        try:
+            with open(cache_path) as cf:
+                cache = json.load(cf)
+            fetched_at = datetime.fromisoformat(cache["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if cache.get("key") != self.__cache_key() or datetime.now() - fetched_at > CACHE_TTL:
+            return None
+
+        return [tuple(g) for g in cache["granules"]]
+
+
+    def __save_cache(self, cache_path, granules):
+        """
+        Saves the granules found for the current search parameters. The file is replaced atomically, so an
+        interrupted write never leaves a truncated cache behind.
+        """
+        cache = {"key": self.__cache_key(), "fetched_at": datetime.now().isoformat(), "granules": granules}
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(cache_path) or ".", prefix=CACHE_FILENAME,
+                                             suffix=".tmp", delete=False) as cf:
+                tmp_path = cf.name
+                json.dump(cache, cf)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"[Finder] Could not save search results to \"{cache_path}\": {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+    def __save_granule_list(self, granules, output_filepath):
+        """
+        Saves a txt file with all the granule links found, one per line.
+        """
+        filename = f"{self.product.replace('.', '_')}_GranuleList_{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
+        output_filepath = output_filepath if not output_filepath is None else ""
+        # Open file and write each granule link on a new line
+        with open(os.path.join(output_filepath, filename), "w") as gf:
+            for g in granules:
+                gf.write(f"{g[0]}\n")
+
+        print(f"[Finder] Saved links to file {os.path.join(output_filepath, filename)}")
+
+
+    def find(self, save_file=True, output_filepath=None, use_cache=False) -> list:
         """
         Executes the finding algorithm.
         Args:
             save_file: If true, saves all the download URLs to a file.
             output_filepath: Filepath to URLs file.
+            use_cache: If true, reuses the granules found by a previous search with the same parameters in
+                       *output_filepath*, if made less than CACHE_TTL ago, instead of querying CMR, and saves the
+                       results for the next search.
 
         Returns:
             a list with all the date filtered granule links for download
         """
 
+        cache_path = os.path.join(output_filepath if not output_filepath is None else "", CACHE_FILENAME)
+        if use_cache:
+            cached = self.__load_cache(cache_path)
+            if cached is not None:
+                print(f"[Finder] Reusing {len(cached)} granules found by a previous search over bbox [{self.roi}]")
+                if save_file:
+                    self.__save_granule_list(cached, output_filepath)
+                return cached
+
         all_granules = self.__find_all_granules()
 
         print(f"[Finder] Found {len(all_granules)} granules over bbox [{self.roi}]")
@@ -141,14 +224,9 @@ class GEDIFinder:
         print(f"[Finder] Estimated download size for select granules : {self.__check_download_size(granules_date_filtered):.2f} GB")
         
         if save_file:
-            # Save txt file with all the links found
-            filename = f"{self.product.replace('.', '_')}_GranuleList_{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
-            output_filepath = output_filepath if not output_filepath is None else ""
-            # Open file and write each granule link on a new line
-            with open(os.path.join(output_filepath, filename), "w") as gf:
-                for g in granules_date_filtered:
-                    gf.write(f"{g[0]}\n")
-
-            print(f"[Finder] Saved links to file {os.path.join(output_filepath, filename)}")
+            self.__save_granule_list(granules_date_filtered, output_filepath)
+
+        if use_cache:
+            self.__save_cache(cache_path, granules_date_filtered)
 
         return granules_date_filtered
\ No newline at end of file
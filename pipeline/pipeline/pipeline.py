@@ -1,7 +1,10 @@
-from .finder import *
-from .subsetter import *
-from .downloader import *
-import geopandas as gp
+import os
+import threading
+from pathlib import PurePosixPath
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .finder import GEDIFinder
+from .downloader import GEDIDownloader
 
 """
 Script that controls the entire GEDI Finder - Downloader - Subsetter pipeline.
@@ -12,9 +15,12 @@ class GEDIPipeline:
     The GEDIPipeline :class: performs all operations in selecting, downloading and subsetting GEDI Data for a given region of interest
     Args:
         out
+        download_workers: Number of granules downloaded concurrently.
+        subset_workers: Number of downloaded granules subsetted concurrently.
+        session_pool: Authenticated SessionPool to reuse, e.g. across runs. If None, the downloader creates one.
     """
 
-    def __init__(self, out_directory, product, version, date_start, date_end, roi, sds, beams, recurring_months=False, persist_login=False, keep_original_file=False, cancel_event=None, roi_path=None):
+    def __init__(self, out_directory, product, version, date_start, date_end, roi, sds, beams, recurring_months=False, persist_login=False, keep_original_file=False, cancel_event=None, roi_path=None, download_workers=6, subset_workers=2, session_pool=None):
 
         self.product = product
         self.version = version
@@ -30,27 +36,27 @@ class GEDIPipeline:
         if isinstance(roi, str):
             self.roi = [float(c) for c in roi.split(",")]
 
-        self.roi_gdf = None
+        # The ROI polygons are only loaded when the subsetter clips the first granule
+        self._roi_gdf = None
+        self._roi_gdf_lock = threading.Lock()
         if self.roi_path:
             try:
-                gdf = gp.read_file(self.roi_path)
-                if gdf.crs is None:
-                    print("[Pipeline] ROI file has no CRS. Assuming EPSG:4326.")
-                    gdf.set_crs(epsg=4326, inplace=True)
-                else:
-                    gdf = gdf.to_crs(epsg=4326)
-                self.roi_gdf = gdf
-                minx, miny, maxx, maxy = gdf.total_bounds
+                minx, miny, maxx, maxy = self._read_roi_bounds()
                 self.roi = [maxy, minx, miny, maxx]  # UL_lat, UL_lon, LR_lat, LR_lon
                 print(f"[Pipeline] ROI bounds derived from polygon: {self.roi}")
             except Exception as e:
                 print(f"[Pipeline] Failed to read ROI polygon file: {e}")
+                self.roi_path = None
 
         self.out_directory = out_directory
         self.sds = sds
         self.beams = beams
         self.persist_login = persist_login
         self.cancel_event = cancel_event
+        self.download_workers = download_workers
+        self.subset_workers = subset_workers
+        # Names of the files in out_directory, filled by run_pipeline
+        self.existing_files = set()
 
         self.finder = GEDIFinder(
             product=self.product,
@@ -63,16 +69,21 @@ class GEDIPipeline:
         
         self.downloader = GEDIDownloader(
             persist_login=self.persist_login,
-            save_path=self.out_directory
+            save_path=self.out_directory,
+            session_pool=session_pool,
+            cancel_event=self.cancel_event
         )
 
+        # h5py, pandas and geopandas are only loaded once a pipeline is actually built
+        from .subsetter import GEDISubsetter
+
         self.subsetter = GEDISubsetter(
             roi=self.roi,
             product=self.product,
             out_dir=self.out_directory,
             sds=self.sds,
             beams=self.beams,
-            roi_gdf=self.roi_gdf
+            roi_gdf=(lambda: self.roi_gdf) if self.roi_path else None
         )
 
         # Make dir if not exists
@@ -80,37 +91,134 @@ class GEDIPipeline:
             os.mkdir(out_directory)
 
 
+    def _read_roi_bounds(self):
+        """
+        Returns the (minx, miny, maxx, maxy) bounds in EPSG:4326 of the ROI file, read from the layer
+        metadata without loading its features.
+        """
+        try:
+            from pyproj import CRS, Transformer
+            bounds, crs = self._read_roi_metadata()
+        except ImportError:
+            bounds = None
+
+        # Without a metadata reader, or bounds in the metadata, fall back to loading the polygons
+        if bounds is None:
+            return self.roi_gdf.total_bounds
+
+        if not crs:
+            print("[Pipeline] ROI file has no CRS. Assuming EPSG:4326.")
+            return bounds
+
+        return Transformer.from_crs(CRS.from_user_input(crs), 4326, always_xy=True).transform_bounds(*bounds)
+
+    def _read_roi_metadata(self):
+        """
+        Returns the bounds and CRS of the ROI file with pyogrio (used by geopandas >= 1.0) or fiona,
+        whichever is installed. Raises ImportError when neither is. The bounds are None for a layer without features.
+        """
+        try:
+            import pyogrio
+        except ImportError:
+            import fiona
+
+            with fiona.open(self.roi_path) as src:
+                return src.bounds, src.crs_wkt
+
+        info = pyogrio.read_info(self.roi_path, force_total_bounds=True)
+        return info["total_bounds"], info["crs"]
+
+    @property
+    def roi_gdf(self):
+        """ROI polygons reprojected to EPSG:4326, read from *roi_path* on first access. None without a ROI file."""
+        with self._roi_gdf_lock:
+            if self._roi_gdf is None and self.roi_path:
+                import geopandas as gp
+
+                gdf = gp.read_file(self.roi_path)
+                if gdf.crs is None:
+                    gdf.set_crs(epsg=4326, inplace=True)
+                else:
+                    gdf = gdf.to_crs(epsg=4326)
+                self._roi_gdf = gdf
+            return self._roi_gdf
+
+    def _cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _download(self, url, exists):
+        # Try Download, retrying transient failures
+        return self.downloader._download_with_retry(url, exists=exists).ok
+
+    def _subset(self, h5_path):
+        # Subsets still queued when the run is cancelled are skipped, the granule is kept for the next run
+        if self._cancelled():
+            return
+
+        # Subset
+        h5_name = os.path.basename(h5_path)
+        if self.subsetter.subset(h5_path) is not None:
+            self.existing_files.add(f"{os.path.splitext(h5_name)[0]}.gpkg")
+
+        # Delete original file and keep subset to ROI granule to save space
+        if not self.keep_original_file:
+            os.remove(h5_path)
+            self.existing_files.discard(h5_name)
+
     def run_pipeline(self):
 
-        all_granules = self.finder.find(output_filepath=self.out_directory, save_file=True)
-
-        # Start download for every granule
-        for g in all_granules:
-            if self.cancel_event is not None and self.cancel_event.is_set():
-                print("[Pipeline] Cancelled by user.")
-                break
-
-            if os.path.exists(os.path.join(self.out_directory, g[0].split("/")[-1].replace(".h5", ".gpkg"))):
-                print(f"Skipping granule from link {g} as it is already subsetted.")
-                continue
-
-            # Try Download
-            if not self.downloader.download_granule(g[0]):
-                retries = 3
-                print(f"[Downloader] Fail download for link {g}. Retrying...")
-                for r in retries:
-                    print(f"Retry {r}")
-                    if not self.downloader.download_granule(g[0]):
-                        retries -= 1
-                        continue
-                print(f"[Downloader] Fail download for link {g}. Skipping...")
-                continue
-
-            # Subset
-            self.subsetter.subset(os.path.join(self.out_directory, g[0].split("/")[-1]))
-
-            # Delete original file and keep subset to ROI granule to save space
-            if not self.keep_original_file:
-                os.remove(os.path.join(self.out_directory, g[0].split("/")[-1]))
+        all_granules = self.finder.find(output_filepath=self.out_directory, save_file=True, use_cache=True)
+
+        # Files already in the output directory, listed once and kept up to date as granules are processed
+        self.existing_files = {e.name for e in os.scandir(self.out_directory) if e.is_file()}
+
+        pending = [(g[0], PurePosixPath(g[0])) for g in all_granules]
+        pending = [(url, granule) for url, granule in pending if f"{granule.stem}.gpkg" not in self.existing_files]
+        if len(pending) < len(all_granules):
+            print(f"[Pipeline] Skipping {len(all_granules) - len(pending)} granules as they are already subsetted.")
+        if not pending:
+            return all_granules
+
+        # Downloads are network-bound and run on a wider pool; each finished download is handed to the subset pool.
+        # Downloaded granules wait on disk until subsetted, so only a bounded number of granules is in flight at once
+        max_in_flight = self.download_workers + self.subset_workers
+        queued = iter(pending)
+        downloads, subsets = {}, set()
+
+        with ThreadPoolExecutor(max_workers=self.download_workers) as download_pool, \
+             ThreadPoolExecutor(max_workers=self.subset_workers) as subset_pool:
+            try:
+                # Wake up regularly to notice a cancellation while downloads and subsets are still in progress
+                while not self._cancelled():
+                    while len(downloads) + len(subsets) < max_in_flight:
+                        url, granule = next(queued, (None, None))
+                        if url is None:
+                            break
+                        future = download_pool.submit(self._download, url, granule.name in self.existing_files)
+                        downloads[future] = os.path.join(self.out_directory, granule.name)
+
+                    if not downloads and not subsets:
+                        break
+
+                    done, _ = wait(set(downloads) | subsets, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in subsets:
+                            subsets.discard(future)
+                            # Surface subsetting errors
+                            future.result()
+                            continue
+
+                        h5_path = downloads.pop(future)
+                        if future.result():
+                            self.existing_files.add(os.path.basename(h5_path))
+                            subsets.add(subset_pool.submit(self._subset, h5_path))
+            finally:
+                # On cancellation or an error, drop queued work instead of waiting for it when leaving the pools.
+                # Running downloads stop by themselves after their current chunk once cancelled
+                download_pool.shutdown(wait=False, cancel_futures=True)
+                subset_pool.shutdown(wait=False, cancel_futures=True)
+
+        if self._cancelled():
+            print("[Pipeline] Cancelled by user.")
 
         return all_granules
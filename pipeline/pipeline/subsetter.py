@@ -5,7 +5,9 @@ import pandas as pd
 from shapely.geometry import Polygon
 import geopandas as gp
 import argparse
+import re
 import sys
+import threading
 import numpy as np
 import warnings
 warnings.filterwarnings("ignore")
@@ -35,23 +37,35 @@ l4a_subset = ['/lat_lowestmode', '/lon_lowestmode', '/channel', '/shot_number',
              '/rx_cumulative', '/digital_elevation_model_srtm', '/elevation_bias_flag', '/surface_flag',  '/num_detectedmodes',  '/selected_algorithm',
              '/solar_elevation'] # TODO: select relevant L4A product variables
 
+# Separators accepted between beam / SDS names given as a single string
+_SPLIT = re.compile(r"[,\s]+")
+
 # Default BEAM Subset
 beam_subset = ['BEAM0000', 'BEAM0001', 'BEAM0010', 'BEAM0011', 'BEAM0101', 'BEAM0110', 'BEAM1000', 'BEAM1011']
  
 
+def _as_list(names):
+    """Beams / SDS arrive as a comma or space separated string (CLI and plugin) or as an already parsed sequence."""
+    if isinstance(names, str):
+        return [n for n in _SPLIT.split(names) if n]
+    return list(names)
+
+
 class GEDISubsetter:
     """
     The GEDISubsetter :class: clips the granule to the specified ROI and selects all the desired variables for each footprint
     Args:
         roi: Region of Interest to search for granules. Coordinates must be in WG84 EPSG:4326 and organized as follows: [UL_Lat, UL_Lon, LR_Lat, LR_Lon]
              Rectangle polygons ONLY. TODO: Take SHP files as argument and MultiPolygon
-        sds: Science Dataset variables used to extract from the granule. Check the product Data Dictionary for more info.
+        sds: Science Dataset variables used to extract from the granule, as a sequence or a comma separated string. Check the product Data Dictionary for more info.
              If the variable is inside a group except BEAMXXXX/, it must be specified ( e.g '/geolocation/lat_lowestmode' )
              If None, extracts the default variables; else it appends to default variables.
-        beams: Keeps footprints of select BEAMS to extract from the granule. If none, selects all the available GEDI Beams.
+        beams: Keeps footprints of select BEAMS (sequence or comma separated string) to extract from the granule. If none, selects all the available GEDI Beams.
                Available BEAMS: ['BEAM0000', 'BEAM0001', 'BEAM0010', 'BEAM0011', 'BEAM0101', 'BEAM0110', 'BEAM1000', 'BEAM1011']
         product: GEDI Product (without version). Products available are {'GEDI01_B'; 'GEDI02_A'; 'GEDI02_B'; 'GEDI04_A'}
         out_dir: Filepath to save the subsetted granule in the 'out_format' file.
+        roi_gdf: GeoDataFrame (EPSG:4326) with the exact ROI polygons to clip to, or a callable returning it.
+                 A callable is only evaluated when the first granule is clipped, with *roi* holding its bounds.
         out_format: File format for the subsetted granule. 
                     The subset function outputs the final clipped and subsetted granule to a GeoPKG file, by default.
                     TODO: The user can also select the following options: {GEOJSON, SHP}
@@ -79,11 +93,15 @@ class GEDISubsetter:
     def _preprocess(self):
 
         # Define Polygon for subsetting
-        if self.roi_gdf is not None:
-            self.final_clip = self.roi_gdf
-            minx, miny, maxx, maxy = self.final_clip.total_bounds
+        self._final_clip = None
+        # Subsets may run concurrently; the loader is only called once
+        self._final_clip_lock = threading.Lock()
+        if self.roi_gdf is not None and not callable(self.roi_gdf):
+            self._final_clip = self.roi_gdf
+            minx, miny, maxx, maxy = self._final_clip.total_bounds
             self.ROI = Polygon([(minx, maxy), (maxx, maxy), (maxx, miny), (minx, miny)])
         else:
+            # With a loader, *roi* already holds the bounds of the ROI polygons
             try:
                 self.ROI = Polygon([(self.roi[1], self.roi[0]), (self.roi[3], self.roi[0]), (self.roi[3], self.roi[2]), (self.roi[1], self.roi[2])]) 
             except:
@@ -91,30 +109,46 @@ class GEDISubsetter:
                 sys.exit(2)
 
             # Keep the exact input geometry for the final clip to ROI
-            self.final_clip = gp.GeoDataFrame(index=[0], geometry=[self.ROI], crs='EPSG:4326')
+            if self.roi_gdf is None:
+                self._final_clip = gp.GeoDataFrame(index=[0], geometry=[self.ROI], crs='EPSG:4326')
 
         # Define BEAMS
         if self.beams is not None:
-            self.beam_subset = self.beams.split(',')
+            self.beam_subset = _as_list(self.beams)
         else:
             self.beam_subset = beam_subset
 
         # Define product and build SDS subset for extraction
+        # Copy the defaults, so additional SDS never leak into the module-level lists
         if 'GEDI01_B' in self.product:
-            self.sds_subset = l1b_subset
+            self.sds_subset = list(l1b_subset)
         elif 'GEDI02_A' in self.product:
-            self.sds_subset = l2a_subset
+            self.sds_subset = list(l2a_subset)
         elif 'GEDI02_B' in self.product:
-            self.sds_subset = l2b_subset
+            self.sds_subset = list(l2b_subset)
         else:
-            self.sds_subset = l4a_subset
+            self.sds_subset = list(l4a_subset)
 
         # Append defined additional sds to main sds_subset
         if self.sds is not None:
-            layer_subset = self.sds.split(',')
-            [self.sds_subset.append(y) for y in layer_subset]
+            self.sds_subset.extend(_as_list(self.sds))
 
 
+    @property
+    def final_clip(self):
+        """
+        Geometry the subset is clipped to. When *roi_gdf* is a loader, it is called on first use, falling back to
+        the ROI bounding box if the polygons cannot be loaded.
+        """
+        with self._final_clip_lock:
+            if self._final_clip is None:
+                try:
+                    self._final_clip = self.roi_gdf()
+                except Exception as e:
+                    print(f"[Subsetter] Failed to read ROI polygons, clipping to the ROI bounding box instead: {e}")
+                    self._final_clip = gp.GeoDataFrame(index=[0], geometry=[self.ROI], crs='EPSG:4326')
+            return self._final_clip
+
     def _select_beams_within_roi(self, gedi_file, gedi_df, beams, gedi_sds):
         """
         This function selects all the footprints inside the ROI with the select beams
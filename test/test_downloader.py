@@ -0,0 +1,230 @@
+# coding=utf-8
+"""Downloader tests against a local HTTP server.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'leonel.corado@uevora.pt'
+__date__ = '2026-01-05'
+__copyright__ = 'Copyright 2026, Leonel Corado'
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from pipeline.pipeline.downloader import GEDIDownloader, SessionPool, PART_SUFFIX
+
+GRANULE = "GEDI02_A_2021001000000_O00000_01_T00000_02_003_02_V002.h5"
+BODY = os.urandom(256 * 1024)
+
+
+class GranuleHandler(BaseHTTPRequestHandler):
+    """Serves GRANULE with the responses queued in *replies*, then the full body."""
+
+    replies = []
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.requests.append("HEAD")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append("GET")
+        status, body = self.replies.pop(0) if self.replies else (200, BODY)
+        self.send_response(status)
+        # A short body still announces the full size, as a dropped connection would
+        self.send_header("Content-Length", str(len(BODY) if status == 200 else len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GEDIDownloaderTest(unittest.TestCase):
+    """Test retries, error handling and partial downloads."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), GranuleHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/{GRANULE}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Runs before each test."""
+        GranuleHandler.replies = []
+        GranuleHandler.requests = []
+        self.save_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.save_path, GRANULE)
+        self.downloader = GEDIDownloader(save_path=self.save_path, session_pool=SessionPool("user", "pass"))
+        sleep = mock.patch("pipeline.pipeline.downloader.time.sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.downloader.sessions.close()
+        shutil.rmtree(self.save_path)
+
+    def read_granule(self):
+        with open(self.file_path, "rb") as f:
+            return f.read()
+
+    def test_download(self):
+        """A granule is saved complete, with no partial file left behind."""
+        result = self.downloader._download_with_retry(self.url, exists=False)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.bytes_written, len(BODY))
+        self.assertEqual(self.read_granule(), BODY)
+        self.assertEqual(os.listdir(self.save_path), [GRANULE])
+
+    def test_auth_error_not_retried(self):
+        """Refused credentials fail at once."""
+        for status in (401, 403):
+            GranuleHandler.requests = []
+            GranuleHandler.replies = [(status, b"")]
+            result = self.downloader._download_with_retry(self.url, exists=False)
+            self.assertFalse(result.ok)
+            self.assertFalse(result.retryable)
+            self.assertEqual(GranuleHandler.requests, ["GET"])
+
+    def test_client_error_not_retried(self):
+        """A missing granule fails at once."""
+        GranuleHandler.replies = [(404, b"")]
+        result = self.downloader._download_with_retry(self.url, exists=False)
+        self.assertFalse(result.ok)
+        self.assertEqual(GranuleHandler.requests, ["GET"])
+
+    def test_server_error_retried(self):
+        """Server errors and throttling are retried until the download succeeds."""
+        GranuleHandler.replies = [(503, b""), (429, b"")]
+        result = self.downloader._download_with_retry(self.url, exists=False)
+        self.assertTrue(result.ok)
+        self.assertEqual(GranuleHandler.requests, ["GET", "GET", "GET"])
+        self.assertEqual(self.read_granule(), BODY)
+
+    def test_retries_exhausted(self):
+        """A granule failing every attempt is given up after *attempts* requests."""
+        GranuleHandler.replies = [(500, b"")] * 3
+        result = self.downloader._download_with_retry(self.url, attempts=3, exists=False)
+        self.assertFalse(result.ok)
+        self.assertTrue(result.retryable)
+        self.assertEqual(GranuleHandler.requests, ["GET"] * 3)
+
+    def test_short_body_retried(self):
+        """A body shorter than its content-length is retried and never saved under the granule name."""
+        GranuleHandler.replies = [(200, BODY[:1000])]
+        result = self.downloader.download_granule(self.url, exists=False)
+        self.assertFalse(result.ok)
+        self.assertTrue(result.retryable)
+        self.assertEqual(os.listdir(self.save_path), [])
+
+        GranuleHandler.replies = [(200, BODY[:1000])]
+        self.assertTrue(self.downloader._download_with_retry(self.url, exists=False).ok)
+        self.assertEqual(self.read_granule(), BODY)
+
+    def test_interrupted_download(self):
+        """A download killed midway leaves only a partial file, which is downloaded again on the next run."""
+        # A killed download leaves its preallocated, zero-filled partial file
+        with open(self.file_path + PART_SUFFIX, "wb") as f:
+            f.truncate(len(BODY))
+
+        result = self.downloader.download_granule(self.url, exists=True)
+        self.assertTrue(result.ok)
+        self.assertIn("GET", GranuleHandler.requests)
+        self.assertEqual(self.read_granule(), BODY)
+
+    def test_cancelled_download(self):
+        """A cancelled download is not retried and leaves no file behind."""
+        self.downloader.cancel_event = threading.Event()
+        self.downloader.cancel_event.set()
+        result = self.downloader._download_with_retry(self.url, exists=False)
+        self.assertFalse(result.ok)
+        self.assertFalse(result.retryable)
+        self.assertEqual(GranuleHandler.requests, ["GET"])
+        self.assertEqual(os.listdir(self.save_path), [])
+
+    def test_complete_file_skipped(self):
+        """A granule already on disk with the remote size is not downloaded again."""
+        with open(self.file_path, "wb") as f:
+            f.write(BODY)
+
+        result = self.downloader.download_granule(self.url, exists=True)
+        self.assertTrue(result.ok)
+        self.assertEqual(GranuleHandler.requests, ["HEAD"])
+
+    def test_corrupted_file_replaced(self):
+        """A granule on disk with the wrong size is downloaded again."""
+        with open(self.file_path, "wb") as f:
+            f.write(BODY[:1000])
+
+        result = self.downloader.download_granule(self.url, exists=True)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.read_granule(), BODY)
+
+
+class SessionPoolTest(unittest.TestCase):
+    """Test sessions are shared out one per thread and reused."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.pool = SessionPool("user", "pass")
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.pool.close()
+
+    def test_login_keeps_session(self):
+        """The session created on login is handed to the first checkout."""
+        self.pool.login()
+        self.pool.login()
+        self.assertEqual(self.pool._idle.qsize(), 1)
+        session = self.pool._idle.queue[0]
+        with self.pool.session() as s:
+            self.assertIs(s, session)
+            self.assertEqual(s.auth, ("user", "pass"))
+
+    def test_session_reused(self):
+        """A returned session is checked out again instead of creating a new one."""
+        with self.pool.session() as first:
+            pass
+        with self.pool.session() as second:
+            self.assertIs(first, second)
+
+    def test_concurrent_sessions(self):
+        """Sessions checked out at the same time are distinct and all return to the pool."""
+        with self.pool.session() as first, self.pool.session() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(self.pool._idle.qsize(), 2)
+
+    def test_credentials_resolved_once(self):
+        """Credentials resolved by the first session are reused by the next ones."""
+        with mock.patch("pipeline.pipeline.downloader.SessionNASA._load_credentials",
+                        return_value=("netrc-user", "netrc-pass")) as load:
+            pool = SessionPool()
+            with pool.session() as first, pool.session() as second:
+                self.assertEqual(second.auth, ("netrc-user", "netrc-pass"))
+            # Only the first session falls back to .netrc or the prompt
+            self.assertEqual(load.call_args_list, [mock.call(None, None), mock.call("netrc-user", "netrc-pass")])
+            pool.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.TestSuite([unittest.makeSuite(GEDIDownloaderTest), unittest.makeSuite(SessionPoolTest)])
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)